@@ -2,12 +2,19 @@ from typing import Optional, Sequence, Tuple, Union
 
 import torch
 from pytorch_lightning import Callback, LightningModule, Trainer
-from pytorch_lightning.metrics.functional import accuracy
 from torch import device, Tensor
 from torch.nn import functional as F
 from torch.optim import Optimizer
 
 
+def _ce_and_acc(logits: Tensor, y: Tensor) -> Tuple[Tensor, Tensor]:
+    """Cross entropy and accuracy of the logits, without a separate pass of the accuracy metric"""
+    loss = F.cross_entropy(logits, y)
+    with torch.no_grad():
+        acc = (logits.argmax(dim=-1) == y).float().mean()
+    return loss, acc
+
+
 class SSLOnlineEvaluator(Callback):  # pragma: no cover
     """
     Attaches a MLP for fine-tuning using the standard self-supervised protocol.
@@ -34,6 +41,7 @@ class SSLOnlineEvaluator(Callback):  # pragma: no cover
         hidden_dim: Optional[int] = None,
         z_dim: int = None,
         num_classes: int = None,
+        online_eval_every: int = 1,
     ):
         """
         Args:
@@ -42,6 +50,8 @@ class SSLOnlineEvaluator(Callback):  # pragma: no cover
             hidden_dim: Hidden dimension for the fine-tune MLP
             z_dim: Representation dimension
             num_classes: Number of classes
+            online_eval_every: Fine-tune the MLP every n training batches. The MLP only monitors the
+                representation, so skipping batches does not affect the pretrained model
         """
         super().__init__()
 
@@ -52,6 +62,7 @@ class SSLOnlineEvaluator(Callback):  # pragma: no cover
         self.z_dim = z_dim
         self.num_classes = num_classes
         self.dataset = dataset
+        self.online_eval_every = online_eval_every
 
     def on_pretrain_routine_start(self, trainer: Trainer, pl_module: LightningModule) -> None:
         from pl_bolts.models.self_supervised.evaluator import SSLEvaluator
@@ -66,7 +77,14 @@ class SSLOnlineEvaluator(Callback):  # pragma: no cover
         self.optimizer = torch.optim.Adam(pl_module.non_linear_evaluator.parameters(), lr=1e-4)
 
     def get_representations(self, pl_module: LightningModule, x: Tensor) -> Tensor:
-        representations = pl_module(x)
+        # reuse the latents the module already computed for this batch (e.g. CPCV2) instead of encoding it again.
+        # they are consumed here so a later batch never sees stale ones
+        representations = getattr(pl_module, 'online_representations', None)
+        if representations is not None:
+            pl_module.online_representations = None
+            representations = representations.float()
+        else:
+            representations = pl_module(x)
         representations = representations.reshape(representations.size(0), -1)
         return representations
 
@@ -94,6 +112,9 @@ class SSLOnlineEvaluator(Callback):  # pragma: no cover
         batch_idx: int,
         dataloader_idx: int,
     ) -> None:
+        if batch_idx % self.online_eval_every != 0:
+            return
+
         x, y = self.to_device(batch, pl_module.device)
 
         with torch.no_grad():
@@ -103,7 +124,7 @@ class SSLOnlineEvaluator(Callback):  # pragma: no cover
 
         # forward pass
         mlp_preds = pl_module.non_linear_evaluator(representations)  # type: ignore[operator]
-        mlp_loss = F.cross_entropy(mlp_preds, y)
+        mlp_loss, mlp_acc = _ce_and_acc(mlp_preds, y)
 
         # update finetune weights
         mlp_loss.backward()
@@ -111,8 +132,7 @@ class SSLOnlineEvaluator(Callback):  # pragma: no cover
         self.optimizer.zero_grad()
 
         # log metrics
-        train_acc = accuracy(mlp_preds, y)
-        pl_module.log('online_train_acc', train_acc, on_step=True, on_epoch=False)
+        pl_module.log('online_train_acc', mlp_acc, on_step=True, on_epoch=False)
         pl_module.log('online_train_loss', mlp_loss, on_step=True, on_epoch=False)
 
     def on_validation_batch_end(
@@ -133,9 +153,8 @@ class SSLOnlineEvaluator(Callback):  # pragma: no cover
 
         # forward pass
         mlp_preds = pl_module.non_linear_evaluator(representations)  # type: ignore[operator]
-        mlp_loss = F.cross_entropy(mlp_preds, y)
+        mlp_loss, mlp_acc = _ce_and_acc(mlp_preds, y)
 
         # log metrics
-        val_acc = accuracy(mlp_preds, y)
-        pl_module.log('online_val_acc', val_acc, on_step=False, on_epoch=True, sync_dist=True)
+        pl_module.log('online_val_acc', mlp_acc, on_step=False, on_epoch=True, sync_dist=True)
         pl_module.log('online_val_loss', mlp_loss, on_step=False, on_epoch=True, sync_dist=True)
@@ -51,6 +51,7 @@ class AsynchronousLoader(object):
         self.q_size = q_size
 
         self.load_stream = torch.cuda.Stream(device=device)
+        self.compute_stream = torch.cuda.current_stream(device=device)
         self.queue: Queue = Queue(maxsize=self.q_size)
 
         self.idx = 0
@@ -59,7 +60,12 @@ class AsynchronousLoader(object):
 
     def load_loop(self) -> None:  # The loop that will load into the queue in the background
         for i, sample in enumerate(self.dataloader):
-            self.queue.put(self.load_instance(sample))
+            sample = self.load_instance(sample)
+
+            # marks when the copies of this sample are done, so the compute stream only waits for this one
+            event = torch.cuda.Event()
+            event.record(self.load_stream)
+            self.queue.put((sample, event))
             if i == len(self):
                 break
 
@@ -72,7 +78,11 @@ class AsynchronousLoader(object):
                 # Can only do asynchronous transfer if we use pin_memory
                 if not sample.is_pinned():
                     sample = sample.pin_memory()
-                return sample.to(self.device, non_blocking=True)
+                sample = sample.to(self.device, non_blocking=True)
+
+            # the sample is used on the compute stream, the allocator must not hand out its memory before that's done
+            sample.record_stream(self.compute_stream)
+            return sample
         elif elem_type.__module__ == 'numpy' and elem_type.__name__ != 'str_' \
                 and elem_type.__name__ != 'string_':
             if elem_type.__name__ == 'ndarray' \
@@ -109,8 +119,9 @@ class AsynchronousLoader(object):
             self.queue.join()
             self.worker.join()
             raise StopIteration
-        # Otherwise return the next batch
-        out = self.queue.get()
+        # Otherwise return the next batch, once it has been copied to the device
+        out, event = self.queue.get()
+        self.compute_stream.wait_event(event)
         self.queue.task_done()
         self.idx += 1
         return out
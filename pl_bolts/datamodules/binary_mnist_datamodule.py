@@ -54,6 +54,7 @@ class BinaryMNISTDataModule(VisionDataModule):
         shuffle: bool = False,
         pin_memory: bool = False,
         drop_last: bool = False,
+        persistent_workers: bool = False,
         *args: Any,
         **kwargs: Any,
     ) -> None:
@@ -69,6 +70,7 @@ class BinaryMNISTDataModule(VisionDataModule):
             pin_memory: If true, the data loader will copy Tensors into CUDA pinned memory before
                         returning them
             drop_last: If true drops the last incomplete batch
+            persistent_workers: If true, keeps the worker processes alive between epochs
         """
 
         if not _TORCHVISION_AVAILABLE:  # pragma: no cover
@@ -86,6 +88,7 @@ class BinaryMNISTDataModule(VisionDataModule):
             shuffle=shuffle,
             pin_memory=pin_memory,
             drop_last=drop_last,
+            persistent_workers=persistent_workers,
             *args,
             **kwargs,
         )
@@ -69,6 +69,7 @@ class CIFAR10DataModule(VisionDataModule):
         shuffle: bool = False,
         pin_memory: bool = False,
         drop_last: bool = False,
+        persistent_workers: bool = False,
         *args: Any,
         **kwargs: Any,
     ) -> None:
@@ -84,6 +85,7 @@ class CIFAR10DataModule(VisionDataModule):
             pin_memory: If true, the data loader will copy Tensors into CUDA pinned memory before
                         returning them
             drop_last: If true drops the last incomplete batch
+            persistent_workers: If true, keeps the worker processes alive between epochs
         """
         super().__init__(  # type: ignore[misc]
             data_dir=data_dir,
@@ -95,6 +97,7 @@ class CIFAR10DataModule(VisionDataModule):
             shuffle=shuffle,
             pin_memory=pin_memory,
             drop_last=drop_last,
+            persistent_workers=persistent_workers,
             *args,
             **kwargs,
         )
@@ -55,6 +55,7 @@ class FashionMNISTDataModule(VisionDataModule):
         shuffle: bool = False,
         pin_memory: bool = False,
         drop_last: bool = False,
+        persistent_workers: bool = False,
         *args: Any,
         **kwargs: Any,
     ) -> None:
@@ -70,6 +71,7 @@ class FashionMNISTDataModule(VisionDataModule):
             pin_memory: If true, the data loader will copy Tensors into CUDA pinned memory before
                         returning them
             drop_last: If true drops the last incomplete batch
+            persistent_workers: If true, keeps the worker processes alive between epochs
         """
         if not _TORCHVISION_AVAILABLE:  # pragma: no cover
             raise ModuleNotFoundError(
@@ -86,6 +88,7 @@ class FashionMNISTDataModule(VisionDataModule):
             shuffle=shuffle,
             pin_memory=pin_memory,
             drop_last=drop_last,
+            persistent_workers=persistent_workers,
             *args,
             **kwargs,
         )
@@ -5,6 +5,7 @@ from typing import Any, Callable, Optional
 from pytorch_lightning import LightningDataModule
 from torch.utils.data import DataLoader
 
+from pl_bolts.datamodules.vision_datamodule import _persistent_workers_kwargs
 from pl_bolts.datasets import UnlabeledImagenet
 from pl_bolts.transforms.dataset_normalizations import imagenet_normalization
 from pl_bolts.utils import _TORCHVISION_AVAILABLE
@@ -29,6 +30,7 @@ class SSLImagenetDataModule(LightningDataModule):  # pragma: no cover
         shuffle: bool = False,
         pin_memory: bool = False,
         drop_last: bool = False,
+        persistent_workers: bool = False,
         *args: Any,
         **kwargs: Any,
     ) -> None:
@@ -46,6 +48,7 @@ class SSLImagenetDataModule(LightningDataModule):  # pragma: no cover
         self.shuffle = shuffle
         self.pin_memory = pin_memory
         self.drop_last = drop_last
+        self.persistent_workers = persistent_workers
 
     @property
     def num_classes(self) -> int:
@@ -101,7 +104,8 @@ class SSLImagenetDataModule(LightningDataModule):  # pragma: no cover
             shuffle=self.shuffle,
             num_workers=self.num_workers,
             drop_last=self.drop_last,
-            pin_memory=self.pin_memory
+            pin_memory=self.pin_memory,
+            **_persistent_workers_kwargs(self.persistent_workers, self.num_workers),
         )
         return loader
 
@@ -121,7 +125,8 @@ class SSLImagenetDataModule(LightningDataModule):  # pragma: no cover
             shuffle=False,
             num_workers=self.num_workers,
             drop_last=self.drop_last,
-            pin_memory=self.pin_memory
+            pin_memory=self.pin_memory,
+            **_persistent_workers_kwargs(self.persistent_workers, self.num_workers),
         )
         return loader
 
@@ -141,7 +146,8 @@ class SSLImagenetDataModule(LightningDataModule):  # pragma: no cover
             shuffle=False,
             num_workers=self.num_workers,
             drop_last=self.drop_last,
-            pin_memory=self.pin_memory
+            pin_memory=self.pin_memory,
+            **_persistent_workers_kwargs(self.persistent_workers, self.num_workers),
         )
         return loader
 
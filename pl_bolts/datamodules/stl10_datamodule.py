@@ -6,6 +6,7 @@ import torch
 from pytorch_lightning import LightningDataModule
 from torch.utils.data import DataLoader, random_split
 
+from pl_bolts.datamodules.vision_datamodule import _persistent_workers_kwargs
 from pl_bolts.datasets import ConcatDataset
 from pl_bolts.transforms.dataset_normalizations import stl10_normalization
 from pl_bolts.utils import _TORCHVISION_AVAILABLE
@@ -64,6 +65,7 @@ class STL10DataModule(LightningDataModule):  # pragma: no cover
         shuffle: bool = False,
         pin_memory: bool = False,
         drop_last: bool = False,
+        persistent_workers: bool = False,
         *args: Any,
         **kwargs: Any,
     ) -> None:
@@ -79,6 +81,7 @@ class STL10DataModule(LightningDataModule):  # pragma: no cover
             pin_memory: If true, the data loader will copy Tensors into CUDA pinned memory before
                         returning them
             drop_last: If true drops the last incomplete batch
+            persistent_workers: If true, keeps the worker processes alive between epochs
         """
         super().__init__(*args, **kwargs)
 
@@ -97,6 +100,7 @@ class STL10DataModule(LightningDataModule):  # pragma: no cover
         self.shuffle = shuffle
         self.pin_memory = pin_memory
         self.drop_last = drop_last
+        self.persistent_workers = persistent_workers
         self.num_unlabeled_samples = 100000 - unlabeled_val_split
 
     @property
@@ -129,7 +133,8 @@ class STL10DataModule(LightningDataModule):  # pragma: no cover
             shuffle=self.shuffle,
             num_workers=self.num_workers,
             drop_last=self.drop_last,
-            pin_memory=self.pin_memory
+            pin_memory=self.pin_memory,
+            **_persistent_workers_kwargs(self.persistent_workers, self.num_workers),
         )
         return loader
 
@@ -166,7 +171,8 @@ class STL10DataModule(LightningDataModule):  # pragma: no cover
             shuffle=self.shuffle,
             num_workers=self.num_workers,
             drop_last=self.drop_last,
-            pin_memory=self.pin_memory
+            pin_memory=self.pin_memory,
+            **_persistent_workers_kwargs(self.persistent_workers, self.num_workers),
         )
         return loader
 
@@ -194,7 +200,8 @@ class STL10DataModule(LightningDataModule):  # pragma: no cover
             shuffle=False,
             num_workers=self.num_workers,
             drop_last=self.drop_last,
-            pin_memory=self.pin_memory
+            pin_memory=self.pin_memory,
+            **_persistent_workers_kwargs(self.persistent_workers, self.num_workers),
         )
         return loader
 
@@ -236,7 +243,8 @@ class STL10DataModule(LightningDataModule):  # pragma: no cover
             shuffle=False,
             num_workers=self.num_workers,
             drop_last=self.drop_last,
-            pin_memory=self.pin_memory
+            pin_memory=self.pin_memory,
+            **_persistent_workers_kwargs(self.persistent_workers, self.num_workers),
         )
         return loader
 
@@ -257,7 +265,8 @@ class STL10DataModule(LightningDataModule):  # pragma: no cover
             shuffle=False,
             num_workers=self.num_workers,
             drop_last=self.drop_last,
-            pin_memory=self.pin_memory
+            pin_memory=self.pin_memory,
+            **_persistent_workers_kwargs(self.persistent_workers, self.num_workers),
         )
         return loader
 
@@ -276,7 +285,8 @@ class STL10DataModule(LightningDataModule):  # pragma: no cover
             shuffle=self.shuffle,
             num_workers=self.num_workers,
             drop_last=self.drop_last,
-            pin_memory=self.pin_memory
+            pin_memory=self.pin_memory,
+            **_persistent_workers_kwargs(self.persistent_workers, self.num_workers),
         )
         return loader
 
@@ -295,7 +305,8 @@ class STL10DataModule(LightningDataModule):  # pragma: no cover
             shuffle=False,
             num_workers=self.num_workers,
             drop_last=self.drop_last,
-            pin_memory=self.pin_memory
+            pin_memory=self.pin_memory,
+            **_persistent_workers_kwargs(self.persistent_workers, self.num_workers),
         )
         return loader
 
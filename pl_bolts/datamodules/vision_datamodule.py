@@ -6,6 +6,15 @@ import torch
 from pytorch_lightning import LightningDataModule
 from torch.utils.data import DataLoader, Dataset, random_split
 
+from pl_bolts.utils import _TORCH_PERSISTENT_WORKERS_AVAILABLE
+
+
+def _persistent_workers_kwargs(persistent_workers: bool, num_workers: int) -> dict:
+    # only pass the flag when it's on and the DataLoader knows it (torch>=1.7)
+    if persistent_workers and num_workers > 0 and _TORCH_PERSISTENT_WORKERS_AVAILABLE:
+        return {'persistent_workers': True}
+    return {}
+
 
 class VisionDataModule(LightningDataModule):
 
@@ -27,6 +36,7 @@ class VisionDataModule(LightningDataModule):
         shuffle: bool = False,
         pin_memory: bool = False,
         drop_last: bool = False,
+        persistent_workers: bool = False,
         *args: Any,
         **kwargs: Any,
     ) -> None:
@@ -42,6 +52,7 @@ class VisionDataModule(LightningDataModule):
             pin_memory: If true, the data loader will copy Tensors into CUDA pinned memory before
                         returning them
             drop_last: If true drops the last incomplete batch
+            persistent_workers: If true, keeps the worker processes alive between epochs
         """
 
         super().__init__(*args, **kwargs)
@@ -55,6 +66,7 @@ class VisionDataModule(LightningDataModule):
         self.shuffle = shuffle
         self.pin_memory = pin_memory
         self.drop_last = drop_last
+        self.persistent_workers = persistent_workers
 
     def prepare_data(self, *args: Any, **kwargs: Any) -> None:
         """
@@ -135,5 +147,6 @@ class VisionDataModule(LightningDataModule):
             shuffle=shuffle,
             num_workers=self.num_workers,
             drop_last=self.drop_last,
-            pin_memory=self.pin_memory
+            pin_memory=self.pin_memory,
+            **_persistent_workers_kwargs(self.persistent_workers, self.num_workers),
         )
@@ -42,52 +42,41 @@ class CPCTask(nn.Module):
         self.pred_cnn = torch.nn.Conv2d(num_input_channels, self.target_dim, kernel_size=1)
         self.context_cnn = PixelCNN(num_input_channels)
 
-    def compute_loss_h(self, targets, preds, i):
-        b, c, h, w = targets.shape
-
-        # (b, c, h, w) -> (num_vectors, emb_dim)
-        # every vector (c-dim) is a target
-        targets = targets.permute(0, 2, 3, 1).contiguous().reshape([-1, c])
-
-        # select the future (south) targets to predict
-        # selects all of the ones south of the current source
-        preds_i = preds[:, :, :-(i + 1), :] * self.embed_scale
-
-        # (b, c, h, w) -> (b*w*h, c) (all features)
-        # this ordering matches the targets
-        preds_i = preds_i.permute(0, 2, 3, 1).contiguous().reshape([-1, self.target_dim])
-
-        # calculate the strength scores
-        logits = torch.matmul(preds_i, targets.transpose(-1, -2))
-
-        # generate the labels
-        n = b * (h - i - 1) * w
-        b1 = torch.arange(n) // ((h - i - 1) * w)
-        c1 = torch.arange(n) % ((h - i - 1) * w)
-        labels = b1 * h * w + (i + 1) * w + c1
-        labels = labels.to(logits.device)
-        labels = labels.long()
-
-        loss = nn.functional.cross_entropy(logits, labels)
-        return loss
-
     def forward(self, Z):
-        losses = []
-
         context = self.context_cnn(Z)
         targets = self.target_cnn(Z)
 
-        _, _, h, w = Z.shape
+        b, c, h, w = targets.shape
 
         # future prediction
-        preds = self.pred_cnn(context)
-        for steps_to_ignore in range(h - 1):
-            for i in range(steps_to_ignore + 1, h):
-                loss = self.compute_loss_h(targets, preds, i)
-                if not torch.isnan(loss):
-                    losses.append(loss)
-
-        loss = torch.stack(losses).sum()
+        preds = self.pred_cnn(context) * self.embed_scale
+
+        # (b, c, h, w) -> (b*h*w, c)
+        # every vector (c-dim) is a target, the predictions follow the same ordering
+        targets = targets.permute(0, 2, 3, 1).reshape([-1, c])
+        preds = preds.permute(0, 2, 3, 1).reshape([-1, self.target_dim])
+
+        # every prediction is scored against all targets, whatever the offset. compute the strength scores
+        # once and only vary which predictions take part and where their positive target is
+        log_probs = torch.log_softmax(torch.matmul(preds, targets.t()), dim=-1)
+
+        # predict the targets i + 1 rows south of the source, for i in [1, h - 2]
+        n = log_probs.size(0)
+        sources = torch.arange(n, device=log_probs.device)
+        offsets = torch.arange(1, h - 1, device=log_probs.device)
+
+        # (n, nb_offsets) position of the positive target and whether it is still inside the image
+        labels = sources.unsqueeze(1) + (offsets.unsqueeze(0) + 1) * w
+        valid = (sources // w % h).unsqueeze(1) + offsets.unsqueeze(0) + 1 < h
+        labels = torch.where(valid, labels, sources.unsqueeze(1))
+
+        # cross entropy of each offset, averaged over the sources that have a target
+        nll = -log_probs.gather(1, labels).masked_fill(~valid, 0)
+        losses = nll.sum(dim=0) / valid.sum(dim=0)
+
+        # offset i is predicted once per number of steps to ignore below it, ie i times
+        losses = losses * offsets
+        loss = torch.where(torch.isnan(losses), torch.zeros_like(losses), losses).sum()
         return loss
 
 
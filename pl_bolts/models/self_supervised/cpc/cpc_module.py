@@ -4,11 +4,14 @@ CPC V2
 """
 import math
 from argparse import ArgumentParser
-from typing import Optional
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional, Tuple
 
 import pytorch_lightning as pl
 import torch
+from pytorch_lightning.overrides.data_parallel import LightningDistributedDataParallel
 from pytorch_lightning.utilities import rank_zero_warn
+from pytorch_lightning.utilities.parsing import str_to_bool
 from torch import optim as optim
 
 from pl_bolts.datamodules.stl10_datamodule import STL10DataModule
@@ -22,11 +25,31 @@ from pl_bolts.models.self_supervised.cpc.transforms import (
     CPCTrainTransformsImageNet128,
     CPCTrainTransformsSTL10,
 )
+from pl_bolts.utils import (
+    _TORCH_AUTOCAST_AVAILABLE,
+    _TORCH_COMPILE_AVAILABLE,
+    _TORCH_CUDA_GRAPHS_AVAILABLE,
+    _TORCH_FUSED_ADAM_AVAILABLE,
+    _TORCH_INFERENCE_MODE_AVAILABLE,
+)
 from pl_bolts.utils.pretrained_weights import load_pretrained
 from pl_bolts.utils.self_supervised import torchvision_ssl_encoder
 
 __all__ = ['CPCV2']
 
+# (encoder_name, task, patch_size) -> (c, h) of the latents, saves the dummy forward for known setups
+_SHAPE_CACHE: Dict[Tuple[str, str, int], Tuple[int, int]] = {}
+
+
+def _unpack_batch(batch):
+    return batch
+
+
+def _unpack_stl10_batch(batch):
+    # the mixed stl10 loader yields (unlabeled_batch, labeled_batch)
+    unlabeled_batch = batch[0]
+    return unlabeled_batch
+
 
 class CPCV2(pl.LightningModule):
 
@@ -41,6 +64,9 @@ class CPCV2(pl.LightningModule):
         num_classes: int = 10,
         learning_rate: float = 1e-4,
         pretrained: Optional[str] = None,
+        compile: bool = True,
+        bf16_autocast: bool = True,
+        use_cuda_graphs: bool = False,
         **kwargs,
     ):
         """
@@ -55,18 +81,49 @@ class CPCV2(pl.LightningModule):
             num_classes: number of classes
             learning_rate: learning rate
             pretrained: If true, will use the weights pretrained (using CPC) on Imagenet
+            compile: If true (and supported by the installed PyTorch), compiles the encoder and the
+                contrastive task with ``torch.compile``
+            bf16_autocast: If true, runs the encoder and the contrastive task under bfloat16 autocast
+                on GPUs that support it. Ignored when the trainer runs its own mixed precision (``precision=16``)
+            use_cuda_graphs: If true, captures the forward and backward of the encoder in a CUDA graph on the
+                first training batch and replays it for every batch of the same shape. Takes the place of
+                compiling the encoder
         """
 
         super().__init__()
         self.save_hyperparameters()
 
         self.online_evaluator = self.hparams.online_ft
+        self.online_representations: Optional[torch.Tensor] = None
+        self._unpack_batch: Callable = _unpack_batch
+        self._batch_packing_checked = False
+        self._bf16_autocast = bf16_autocast and _TORCH_AUTOCAST_AVAILABLE
+        self._use_cuda_graphs = use_cuda_graphs and _TORCH_CUDA_GRAPHS_AVAILABLE
+        self._graphed_encoder: Optional[Callable] = None
+        self._graphed_shape: Optional[torch.Size] = None
 
         if pretrained:
             self.hparams.dataset = pretrained
             self.online_evaluator = True
 
+        # specialize the steps once: only hand the latents to the online evaluator when there is one
+        self.shared_step: Callable = self._shared_step_eval if self.online_evaluator else self._shared_step_noeval
+
         self.encoder = self.init_encoder()
+        # NHWC lets the conv kernels of the batchnorm resnets vectorize over channels. The cpc encoder normalizes
+        # with LayerNorm over (c, h, w), which works in NCHW and would convert back and forth around every norm
+        self._channels_last = self.hparams.encoder_name != 'cpc_encoder'
+        if self._channels_last:
+            self.encoder = self.encoder.to(memory_format=torch.channels_last)
+
+        # resolve once how the latents come out of the encoder instead of branching on every forward
+        self._encode: Callable[[torch.Tensor], torch.Tensor]
+        if self._use_cuda_graphs:
+            self._encode = self._encode_graphed
+        elif self.hparams.encoder_name == 'cpc_encoder':
+            self._encode = self.encoder.__call__
+        else:
+            self._encode = self._encode_first_feature_map
 
         # info nce loss
         c, h = self.__compute_final_nb_c(self.hparams.patch_size)
@@ -78,6 +135,13 @@ class CPCV2(pl.LightningModule):
         if pretrained:
             self.load_pretrained(self.hparams.encoder_name)
 
+        if compile and _TORCH_COMPILE_AVAILABLE:
+            # patches always come in as (b * p, c, patch_size, patch_size), so specialize on that single shape.
+            # compiling in place keeps the state dict keys untouched (pretrained weights, checkpoints)
+            if not self._use_cuda_graphs:
+                self.encoder.compile(mode='reduce-overhead', dynamic=False)
+            self.contrastive_task.compile(dynamic=False)
+
     def load_pretrained(self, encoder_name):
         available_weights = {'resnet18'}
 
@@ -96,44 +160,126 @@ class CPCV2(pl.LightningModule):
             return torchvision_ssl_encoder(encoder_name, return_all_feature_maps=self.hparams.task == 'amdim')
 
     def __compute_final_nb_c(self, patch_size):
-        dummy_batch = torch.zeros((2 * 49, 3, patch_size, patch_size))
-        dummy_batch = self.encoder(dummy_batch)
-
-        # other encoders return a list
-        if self.hparams.encoder != 'cpc_encoder':
-            dummy_batch = dummy_batch[0]
-
-        dummy_batch = self.__recover_z_shape(dummy_batch, 2)
+        key = (self.hparams.encoder_name, self.hparams.task, patch_size)
+        if key in _SHAPE_CACHE:
+            return _SHAPE_CACHE[key]
+
+        # the encoder is still on cpu here, so this doesn't allocate device memory before the trainer picks one.
+        # only the shape is needed, so don't track anything for autograd.
+        # eval mode keeps the batchnorm running stats untouched, so a cache hit and a miss build the same encoder
+        no_grad = torch.inference_mode if _TORCH_INFERENCE_MODE_AVAILABLE else torch.no_grad
+        was_training = self.encoder.training
+        self.encoder.eval()
+        try:
+            with no_grad():
+                # 2 images of a fixed 7x7 grid of patches
+                dummy_batch = torch.zeros((2 * 49, 3, patch_size, patch_size))
+                dummy_batch = self._encode(dummy_batch)
+                dummy_batch = self.__recover_z_shape(dummy_batch, 2, 7)
+        finally:
+            self.encoder.train(was_training)
         b, c, h, w = dummy_batch.size()
+        del dummy_batch
+
+        _SHAPE_CACHE[key] = (c, h)
         return c, h
 
-    def __recover_z_shape(self, Z, b):
+    def __recover_z_shape(self, Z, b, nb_feats):
         # recover shape
-        Z = Z.squeeze(-1)
-        nb_patches = int(math.sqrt(Z.size(0) // b))
-        Z = Z.view(b, -1, Z.size(1))
-        Z = Z.permute(0, 2, 1).contiguous()
-        Z = Z.view(b, -1, nb_patches, nb_patches)
+        # (b * nb_feats^2, c, 1, 1) -> (b, c, nb_feats, nb_feats)
+        # no copy: the permuted view is already laid out as channels-last for the convs of the task
+        Z = Z.view(b, nb_feats, nb_feats, -1).permute(0, 3, 1, 2)
 
         return Z
 
+    def _trainer_amp_enabled(self) -> bool:
+        return self.trainer is not None and self.trainer.amp_backend is not None
+
+    @contextmanager
+    def _autocast(self, device):
+        # bf16 keeps the exponent range of fp32, so the loss needs no GradScaler.
+        # with precision=16 the trainer already autocasts to fp16 and scales the loss, leave that alone
+        if (
+            self._bf16_autocast and not self._trainer_amp_enabled() and device.type == 'cuda'
+            and torch.cuda.is_bf16_supported()
+        ):
+            # graph capture can't use the autocast weight cast cache
+            with torch.autocast(device_type='cuda', dtype=torch.bfloat16, cache_enabled=not self._use_cuda_graphs):
+                yield
+        else:
+            yield
+
     def forward(self, img_1):
         # put all patches on the batch dim for simultaneous processing
+        # Patchify already emits contiguous patches, so folding them into the batch dim is a free view
+        # (the channels-last conversion below is still a copy)
         b, p, c, w, h = img_1.size()
         img_1 = img_1.view(-1, c, w, h)
+        if self._channels_last:
+            img_1 = img_1.contiguous(memory_format=torch.channels_last)
 
         # Z are the latent vars
-        Z = self.encoder(img_1)
-
-        # non cpc resnets return a list
-        if self.hparams.encoder != 'cpc_encoder':
-            Z = Z[0]
+        Z = self._encode(img_1)
 
         # (?) -> (b, -1, nb_feats, nb_feats)
-        Z = self.__recover_z_shape(Z, b)
+        # the grid side is sqrt(p) of the patch count already unpacked above, 7 for all the bundled transforms
+        nb_feats = int(math.sqrt(p))
+        Z = self.__recover_z_shape(Z, b, nb_feats)
 
         return Z
 
+    def _encode_first_feature_map(self, img_1):
+        # non cpc resnets return a list
+        return self.encoder(img_1)[0]
+
+    def _encode_graphed(self, img_1):
+        if self.training and img_1.is_cuda and torch.is_grad_enabled():
+            Z = self._graphed_encoder_forward(img_1)
+        else:
+            Z = self.encoder(img_1)
+
+        # non cpc resnets return a list
+        return Z if self.hparams.encoder_name == 'cpc_encoder' else Z[0]
+
+    def _graphed_encoder_forward(self, img_1):
+        # the first training batch fixes the captured shape, any other shape (last batch) runs eagerly
+        if self._graphed_encoder is None:
+            # make_graphed_callables warms up and captures with this batch and patches the encoder's forward
+            torch.cuda.make_graphed_callables(self.encoder, (img_1.detach().clone(),))
+            self._graphed_encoder = self.encoder.forward
+            self._graphed_shape = img_1.shape
+
+            # keep the eager forward on the encoder for validation and other shapes
+            del self.encoder.forward
+
+        if img_1.shape != self._graphed_shape:
+            return self.encoder(img_1)
+
+        return self._graphed_encoder(img_1)
+
+    def on_train_batch_start(self, batch, batch_idx, dataloader_idx):
+        if not self._batch_packing_checked:
+            self.__check_batch_packing(batch)
+
+        # only all-reduce the gradients on the micro-step that ends an accumulation window.
+        # Lightning's DDP wrapper prepares the reducer at the end of every forward unless PREPARE_FOR_BACKWARDS
+        # is off, and an unprepared reducer skips the all-reduce in the backward (the grads keep accumulating)
+        model = self.trainer.model
+        if isinstance(model, LightningDistributedDataParallel) and self.trainer.accumulate_grad_batches > 1:
+            model.PREPARE_FOR_BACKWARDS = not self.trainer.train_loop.should_accumulate()
+
+    def __check_batch_packing(self, batch):
+        # every patch is a row of the encoder GEMMs, tensor cores work on tiles of multiples of 8 rows
+        img_1, _ = self._unpack_batch(batch)
+        b, p = img_1.shape[:2]
+        if (b * p) % 8 != 0:
+            rank_zero_warn(
+                f'The encoder sees {b} images x {p} patches = {b * p} rows per batch, which is not a multiple of 8'
+                f' and leaves tensor cores partly idle. Use a batch size that is a multiple of {8 // math.gcd(p, 8)}'
+                f' (multiples of {64 // math.gcd(p, 64)} images fill whole 64-row tiles).'
+            )
+        self._batch_packing_checked = True
+
     def training_step(self, batch, batch_nb):
         # calculate loss
         nce_loss = self.shared_step(batch)
@@ -150,24 +296,49 @@ class CPCV2(pl.LightningModule):
         self.log('val_nce', nce_loss, prog_bar=True)
         return nce_loss
 
-    def shared_step(self, batch):
+    def setup(self, stage):
+        # the batch layout is fixed by the datamodule, so pick how to unpack it once instead of on every step
         if isinstance(self.datamodule, STL10DataModule):
-            unlabeled_batch = batch[0]
-            batch = unlabeled_batch
+            self._unpack_batch = _unpack_stl10_batch
 
-        img_1, y = batch
+            # stl10 evaluates on the separate labeled batch which still needs its own forward pass
+            self.shared_step = self._shared_step_noeval
 
-        # generate features
-        # Latent features
-        Z = self(img_1)
+    def _shared_step_eval(self, batch):
+        nce_loss, Z = self.__nce_loss(batch)
+
+        # the online evaluator fine-tunes on this same batch, so hand it the latents instead of encoding twice.
+        # detaching doesn't copy, the evaluator only casts them on the batches it actually trains on
+        self.online_representations = Z.detach()
+        return nce_loss
 
-        # infoNCE loss
-        nce_loss = self.contrastive_task(Z)
+    def _shared_step_noeval(self, batch):
+        nce_loss, _ = self.__nce_loss(batch)
         return nce_loss
 
+    def __nce_loss(self, batch):
+        img_1, y = self._unpack_batch(batch)
+
+        with self._autocast(img_1.device):
+            # generate features
+            # Latent features
+            Z = self(img_1)
+
+            # infoNCE loss
+            nce_loss = self.contrastive_task(Z)
+
+        return nce_loss, Z
+
     def configure_optimizers(self):
+        # the fused kernel updates all the parameters at once instead of launching kernels per tensor
+        fused_kwargs = {'fused': True} if _TORCH_FUSED_ADAM_AVAILABLE and self.device.type == 'cuda' else {}
         opt = optim.Adam(
-            params=self.parameters(), lr=self.hparams.learning_rate, betas=(0.8, 0.999), weight_decay=1e-5, eps=1e-7
+            params=self.parameters(),
+            lr=self.hparams.learning_rate,
+            betas=(0.8, 0.999),
+            weight_decay=1e-5,
+            eps=1e-7,
+            **fused_kwargs,
         )
 
         # if self.hparams.dataset in ['cifar10', 'stl10']:
@@ -186,7 +357,7 @@ class CPCV2(pl.LightningModule):
             'resnet18', 'resnet34', 'resnet50', 'resnet101', 'resnet152', 'resnext50_32x4d', 'resnext101_32x8d',
             'wide_resnet50_2', 'wide_resnet101_2'
         ]
-        parser.add_argument('--encoder', default='cpc_encoder', type=str, choices=possible_resnets)
+        parser.add_argument('--encoder_name', default='cpc_encoder', type=str, choices=possible_resnets)
         # cifar10: 1e-5, stl10: 3e-5, imagenet: 4e-4
         parser.add_argument('--learning_rate', type=float, default=1e-5)
 
@@ -195,7 +366,7 @@ class CPCV2(pl.LightningModule):
 
 def cli_main():
     from pl_bolts.callbacks.ssl_online import SSLOnlineEvaluator
-    from pl_bolts.datamodules import CIFAR10DataModule
+    from pl_bolts.datamodules import AsynchronousLoader, CIFAR10DataModule
     from pl_bolts.datamodules.ssl_imagenet_datamodule import SSLImagenetDataModule
 
     pl.seed_everything(1234)
@@ -207,12 +378,18 @@ def cli_main():
     parser.add_argument('--meta_dir', default='.', type=str, help='path to meta.bin for imagenet')
     parser.add_argument('--num_workers', default=8, type=int)
     parser.add_argument('--batch_size', type=int, default=128)
+    parser.add_argument('--pin_memory', type=str_to_bool, default=True)
+    parser.add_argument('--persistent_workers', type=str_to_bool, default=True)
+    parser.add_argument(
+        '--async_loader', action='store_true', help='copy the batches to the GPU on a side stream (single GPU only)'
+    )
+    parser.add_argument('--online_eval_every', type=int, default=4, help='fine-tune the online MLP every n batches')
 
     args = parser.parse_args()
 
     datamodule = None
 
-    online_evaluator = SSLOnlineEvaluator()
+    online_evaluator = SSLOnlineEvaluator(dataset=args.dataset, online_eval_every=args.online_eval_every)
     if args.dataset == 'cifar10':
         datamodule = CIFAR10DataModule.from_argparse_args(args)
         datamodule.train_transforms = CPCTrainTransformsCIFAR10()
@@ -245,8 +422,19 @@ def cli_main():
         datamodule.val_transforms = CPCEvalTransformsImageNet128()
         args.patch_size = 32
 
+    if args.async_loader:
+        train_dataloader = datamodule.train_dataloader
+        datamodule.train_dataloader = lambda: AsynchronousLoader(train_dataloader())
+
     model = CPCV2(**vars(args))
-    trainer = pl.Trainer.from_argparse_args(args, callbacks=[online_evaluator])
+
+    callbacks = []
+    if model.online_evaluator:
+        online_evaluator.z_dim = model.z_dim
+        online_evaluator.num_classes = datamodule.num_classes
+        callbacks.append(online_evaluator)
+
+    trainer = pl.Trainer.from_argparse_args(args, callbacks=callbacks)
     trainer.fit(model, datamodule=datamodule)
 
 
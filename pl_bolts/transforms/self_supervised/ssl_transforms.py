@@ -56,6 +56,11 @@ class RandomTranslateWithReflect:
 
 
 class Patchify(object):
+    """
+    Cuts a (c, h, w) image tensor into overlapping square patches.
+    Returns a single contiguous (nb_patches, c, patch_size, patch_size) tensor,
+    so the default collate produces one (b, nb_patches, c, patch_size, patch_size) batch
+    """
 
     def __init__(self, patch_size, overlap_size):
         self.patch_size = patch_size
@@ -1,9 +1,17 @@
+from inspect import signature
+
 import torch
 from pytorch_lightning.utilities import _module_available
 
 from pl_bolts.callbacks.verification.batch_gradient import BatchGradientVerification  # type: ignore
 
 _NATIVE_AMP_AVAILABLE: bool = _module_available("torch.cuda.amp") and hasattr(torch.cuda.amp, "autocast")
+_TORCH_AUTOCAST_AVAILABLE: bool = hasattr(torch, "autocast")
+_TORCH_COMPILE_AVAILABLE: bool = hasattr(torch.nn.Module, "compile")
+_TORCH_FUSED_ADAM_AVAILABLE: bool = "fused" in signature(torch.optim.Adam).parameters
+_TORCH_INFERENCE_MODE_AVAILABLE: bool = hasattr(torch, "inference_mode")
+_TORCH_CUDA_GRAPHS_AVAILABLE: bool = hasattr(torch.cuda, "make_graphed_callables")
+_TORCH_PERSISTENT_WORKERS_AVAILABLE: bool = "persistent_workers" in signature(torch.utils.data.DataLoader).parameters
 
 _TORCHVISION_AVAILABLE: bool = _module_available("torchvision")
 _GYM_AVAILABLE: bool = _module_available("gym")
@@ -0,0 +1,23 @@
+import pytorch_lightning as pl
+import torch
+from torch.utils.data import DataLoader, TensorDataset
+
+from pl_bolts.callbacks.ssl_online import SSLOnlineEvaluator
+from pl_bolts.models.self_supervised import CPCV2
+
+
+def test_ssl_online_evaluator_reuses_cpc_latents(tmpdir):
+    model = CPCV2(encoder_name='resnet18', compile=False, online_ft=True)
+
+    encoder_calls = []
+    model.encoder.register_forward_hook(lambda *_: encoder_calls.append(1))
+
+    online_eval = SSLOnlineEvaluator(dataset='cifar10', z_dim=model.z_dim, num_classes=10)
+    dataset = TensorDataset(torch.rand(4, 49, 3, 8, 8), torch.randint(10, (4, )))
+
+    trainer = pl.Trainer(fast_dev_run=True, default_root_dir=tmpdir, callbacks=[online_eval])
+    trainer.fit(model, DataLoader(dataset, batch_size=2), DataLoader(dataset, batch_size=2))
+
+    # one training and one validation step, each encodes its batch once for both the loss and the online MLP
+    assert len(encoder_calls) == 2
+    assert model.online_representations is None
@@ -4,6 +4,7 @@ from pathlib import Path
 import pytest
 import torch
 from PIL import Image
+from torch.utils.data import TensorDataset
 
 from pl_bolts.datamodules import (
     BinaryMNISTDataModule,
@@ -11,6 +12,7 @@ from pl_bolts.datamodules import (
     CityscapesDataModule,
     FashionMNISTDataModule,
     MNISTDataModule,
+    vision_datamodule,
 )
 from pl_bolts.datasets.cifar10_dataset import CIFAR10
 
@@ -80,6 +82,18 @@ def test_data_modules(datadir, dm_cls):
     assert img.size() == torch.Size([2, *dm.size()])
 
 
+@pytest.mark.parametrize("num_workers, persistent", [(2, True), (0, False)])
+def test_persistent_workers_reach_dataloader(num_workers, persistent):
+    dm = CIFAR10DataModule(num_workers=num_workers, persistent_workers=True)
+    loader = dm._data_loader(TensorDataset(torch.zeros(4, 1)))
+    assert loader.persistent_workers is persistent
+
+
+def test_persistent_workers_skipped_without_torch_support(monkeypatch):
+    monkeypatch.setattr(vision_datamodule, '_TORCH_PERSISTENT_WORKERS_AVAILABLE', False)
+    assert vision_datamodule._persistent_workers_kwargs(True, 2) == {}
+
+
 def _create_dm(dm_cls, datadir, val_split=0.2):
     dm = dm_cls(data_dir=datadir, val_split=val_split, num_workers=1, batch_size=2)
     dm.prepare_data()
@@ -0,0 +1,42 @@
+"""
+Test Self-Supervised Learning Loss Functions
+"""
+
+import pytest
+import torch
+from torch import nn
+
+from pl_bolts.losses.self_supervised_learning import CPCTask
+
+
+def _cpc_loss_per_offset(task, Z):
+    """Reference CPC loss, scoring every prediction offset separately"""
+    targets = task.target_cnn(Z)
+    preds = task.pred_cnn(task.context_cnn(Z))
+    b, c, h, w = targets.shape
+    targets = targets.permute(0, 2, 3, 1).reshape([-1, c])
+
+    losses = []
+    for steps_to_ignore in range(h - 1):
+        for i in range(steps_to_ignore + 1, h):
+            preds_i = preds[:, :, :-(i + 1), :] * task.embed_scale
+            preds_i = preds_i.permute(0, 2, 3, 1).reshape([-1, task.target_dim])
+            logits = torch.matmul(preds_i, targets.t())
+
+            n = b * (h - i - 1) * w
+            labels = torch.arange(n) // ((h - i - 1) * w) * h * w + (i + 1) * w + torch.arange(n) % ((h - i - 1) * w)
+
+            loss = nn.functional.cross_entropy(logits, labels)
+            if not torch.isnan(loss):
+                losses.append(loss)
+
+    return torch.stack(losses).sum()
+
+
+@pytest.mark.parametrize("b, c, h, w", [(2, 16, 7, 7), (3, 8, 5, 6)])
+def test_cpc_task_matches_per_offset_loss(b, c, h, w):
+    torch.manual_seed(0)
+    task = CPCTask(num_input_channels=c, target_dim=8)
+    Z = torch.randn(b, c, h, w)
+
+    torch.testing.assert_allclose(task(Z), _cpc_loss_per_offset(task, Z))
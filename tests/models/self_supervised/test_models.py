@@ -1,11 +1,14 @@
+import pickle
+
 import pytest
 import pytorch_lightning as pl
 import torch
 from pytorch_lightning import seed_everything
+from pytorch_lightning.overrides.data_parallel import LightningDistributedDataParallel
 
 from pl_bolts.datamodules import CIFAR10DataModule
 from pl_bolts.models.self_supervised import AMDIM, BYOL, CPCV2, MocoV2, SimCLR, SimSiam, SwAV
-from pl_bolts.models.self_supervised.cpc import CPCEvalTransformsCIFAR10, CPCTrainTransformsCIFAR10
+from pl_bolts.models.self_supervised.cpc import cpc_module, CPCEvalTransformsCIFAR10, CPCTrainTransformsCIFAR10
 from pl_bolts.models.self_supervised.moco.callbacks import MocoLRScheduler
 from pl_bolts.models.self_supervised.moco.transforms import Moco2EvalCIFAR10Transforms, Moco2TrainCIFAR10Transforms
 from pl_bolts.models.self_supervised.simclr.transforms import SimCLREvalDataTransform, SimCLRTrainDataTransform
@@ -22,7 +25,7 @@ def test_cpcv2(tmpdir, datadir):
     datamodule.train_transforms = CPCTrainTransformsCIFAR10()
     datamodule.val_transforms = CPCEvalTransformsCIFAR10()
 
-    model = CPCV2(encoder='resnet18', online_ft=True, num_classes=datamodule.num_classes)
+    model = CPCV2(encoder_name='resnet18', online_ft=True, num_classes=datamodule.num_classes)
     trainer = pl.Trainer(fast_dev_run=True, max_epochs=1, default_root_dir=tmpdir)
     trainer.fit(model, datamodule=datamodule)
     loss = trainer.progress_bar_dict['val_nce']
@@ -30,6 +33,62 @@ def test_cpcv2(tmpdir, datadir):
     assert float(loss) > 0
 
 
+def test_cpcv2_shape_cache_keeps_initial_state():
+    cpc_module._SHAPE_CACHE.clear()
+
+    seed_everything()
+    model_cache_miss = CPCV2(encoder_name='resnet18', compile=False)
+    seed_everything()
+    model_cache_hit = CPCV2(encoder_name='resnet18', compile=False)
+
+    assert model_cache_miss.encoder.training
+    state_miss, state_hit = model_cache_miss.state_dict(), model_cache_hit.state_dict()
+    assert state_miss.keys() == state_hit.keys()
+    for name in state_miss:
+        assert torch.equal(state_miss[name], state_hit[name]), name
+
+
+@pytest.mark.parametrize(
+    "encoder_name, use_cuda_graphs", [('cpc_encoder', False), ('resnet18', False), ('resnet18', True)]
+)
+def test_cpcv2_pickle(encoder_name, use_cuda_graphs):
+    # ddp_spawn pickles the module to send it to the workers
+    model = CPCV2(encoder_name=encoder_name, compile=False, use_cuda_graphs=use_cuda_graphs)
+    unpickled = pickle.loads(pickle.dumps(model))
+
+    x = torch.rand(2, 49, 3, 8, 8)
+    model.eval()
+    unpickled.eval()
+    torch.testing.assert_allclose(unpickled(x), model(x))
+
+
+class _FakeLightningDDP(LightningDistributedDataParallel):
+    """Stands in for the DDP wrapper without setting up a process group"""
+
+    def __init__(self, module):
+        torch.nn.Module.__init__(self)
+        self.module = module
+
+
+def test_cpcv2_ddp_sync_only_at_end_of_accumulation():
+    model = CPCV2(encoder_name='resnet18', compile=False)
+    model._batch_packing_checked = True
+
+    trainer = pl.Trainer(accumulate_grad_batches=4)
+    trainer.num_training_batches = 6
+    trainer.model = _FakeLightningDDP(model)
+    model.trainer = trainer
+
+    prepared = []
+    for batch_idx in range(trainer.num_training_batches):
+        trainer.batch_idx = batch_idx
+        model.on_train_batch_start(None, batch_idx, 0)
+        prepared.append(trainer.model.PREPARE_FOR_BACKWARDS)
+
+    # the window ends on the 4th batch, the last (partial) window on the final batch
+    assert prepared == [False, False, False, True, False, True]
+
+
 # TODO: this test is hanging (runs for more then 10min) so we need to use GPU or optimize it...
 @pytest.mark.skipif(not torch.cuda.is_available(), reason="test requires GPU machine")
 def test_byol(tmpdir, datadir):